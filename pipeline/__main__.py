@@ -1,122 +1,153 @@
 from __future__ import annotations
 
-import json
+import functools
+import inspect
+import logging
 import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Optional
 
 import typer
 
-from .cluster import cluster as cluster_step
 from .config import CLISettings, make_run_dir, parse_since
-from .ingest import fetch_feeds
 from .logging import setup_logging
-from .io import init_db
-from .rank import score_clusters
-from .summarize import summarize
-from .extract import extract as extract_step
+from .io import init_db, shared_db, write_json
+
+# Stage modules pull in feedparser, trafilatura and the OpenAI client, so each
+# command imports only the stages it runs.
 
 
 app = typer.Typer(add_completion=False, no_args_is_help=True)
 
 
 def _common_settings(
-    out: Optional[Path] = typer.Option(None, help="Output base directory"),
-    since: Optional[str] = typer.Option(None, help="ISO8601 UTC, e.g., 2025-09-01T00:00:00Z"),
-    max_items: Optional[int] = typer.Option(None, help="Max items per feed"),
-    dry_run: bool = typer.Option(False, help="Do not write outputs"),
-    log_level: str = typer.Option("INFO", help="Log level"),
-    parallel: int = typer.Option(6, help="Parallel workers"),
-) -> CLISettings:
+    out: Optional[Path],
+    since: Optional[str],
+    max_items: Optional[int],
+    dry_run: bool,
+    log_level: str,
+    parallel: int,
+) -> tuple[CLISettings, logging.Logger]:
     run_dir = make_run_dir(out)
     logger = setup_logging(run_dir, log_level)
     logger.info("Run directory: %s", run_dir)
-    return CLISettings(out_dir=run_dir, since=parse_since(since), max_items=max_items, dry_run=dry_run, log_level=log_level, parallel=parallel)
+    settings = CLISettings(out_dir=run_dir, since=parse_since(since), max_items=max_items, dry_run=dry_run, log_level=log_level, parallel=parallel)
+    return settings, logger
+
+
+def _option(name: str, annotation: Any, default: Any, help: str) -> inspect.Parameter:
+    return inspect.Parameter(
+        name, inspect.Parameter.POSITIONAL_OR_KEYWORD, default=typer.Option(default, help=help), annotation=annotation
+    )
+
+
+# Options shared by every command, declared once
+_COMMON_OPTIONS = (
+    _option("out", Optional[Path], None, "Output base directory"),
+    _option("since", Optional[str], None, "ISO8601 UTC, e.g., 2025-09-01T00:00:00Z"),
+    _option("max_items", Optional[int], None, "Max items per feed"),
+    _option("dry_run", bool, False, "Do not write outputs"),
+    _option("log_level", str, "INFO", "Log level"),
+    _option("parallel", int, 6, "Parallel workers"),
+)
+
+
+def common_options(f: Callable[..., Any]) -> Callable[..., Any]:
+    # Expose the shared options to typer on the wrapped command, and call it
+    # with the resulting settings and logger instead of the raw values.
+    own = [p for name, p in inspect.signature(f).parameters.items() if name not in ("settings", "logger")]
+
+    @functools.wraps(f)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        # typer passes every option by name; the shared ones are taken out here
+        settings, logger = _common_settings(**{p.name: kwargs.pop(p.name) for p in _COMMON_OPTIONS})
+        return f(*args, settings=settings, logger=logger, **kwargs)
+
+    wrapper.__signature__ = inspect.Signature([*_COMMON_OPTIONS, *own])  # type: ignore[attr-defined]
+    return wrapper
 
 
 @app.command()
-def fetch(
-    out: Optional[Path] = typer.Option(None),
-    since: Optional[str] = typer.Option(None),
-    max_items: Optional[int] = typer.Option(None),
-    dry_run: bool = typer.Option(False),
-    log_level: str = typer.Option("INFO"),
-    parallel: int = typer.Option(6),
-):
+@common_options
+def fetch(settings: CLISettings, logger: logging.Logger):
     """Fetch RSS feeds with ETag/Last-Modified caching into SQLite."""
-    settings = _common_settings(out, since, max_items, dry_run, log_level, parallel)
-    logger = setup_logging(settings.out_dir, settings.log_level)
+    from .ingest import fetch_feeds
+
     init_db()
-    t0 = time.time()
-    totals = fetch_feeds(since=settings.since, max_items=settings.max_items, logger=logger)
-    dt = time.time() - t0
+    t0 = time.perf_counter()
+    totals = fetch_feeds(since=settings.since, max_items=settings.max_items, parallel=settings.parallel, logger=logger)
+    dt = time.perf_counter() - t0
     logger.info("Fetch done in %.2fs: %s", dt, totals)
 
 
 @app.command()
-def extract(
-    out: Optional[Path] = typer.Option(None),
-    since: Optional[str] = typer.Option(None),
-    max_items: Optional[int] = typer.Option(None),
-    dry_run: bool = typer.Option(False),
-    log_level: str = typer.Option("INFO"),
-    parallel: int = typer.Option(6),
-):
+@common_options
+def extract(settings: CLISettings, logger: logging.Logger):
     """Extract article text and canonical URLs via trafilatura."""
-    settings = _common_settings(out, since, max_items, dry_run, log_level, parallel)
-    logger = setup_logging(settings.out_dir, settings.log_level)
+    from .extract import extract as extract_step
+
     init_db()
-    t0 = time.time()
+    t0 = time.perf_counter()
     n = extract_step(limit=settings.max_items, parallel=settings.parallel, logger=logger)
-    dt = time.time() - t0
+    dt = time.perf_counter() - t0
     logger.info("Extract done in %.2fs: %d articles", dt, n)
 
 
 @app.command()
+@common_options
 def cluster(
-    out: Optional[Path] = typer.Option(None),
-    since: Optional[str] = typer.Option(None),
-    max_items: Optional[int] = typer.Option(None),
-    dry_run: bool = typer.Option(False),
-    log_level: str = typer.Option("INFO"),
-    parallel: int = typer.Option(6),
-    threshold: int = typer.Option(8, help="Hamming distance threshold for simhash"),
+    settings: CLISettings,
+    logger: logging.Logger,
+    threshold: int = typer.Option(8, min=0, max=63, help="Hamming distance threshold for simhash"),
 ):
     """Cluster near-duplicate articles via SimHash."""
-    settings = _common_settings(out, since, max_items, dry_run, log_level, parallel)
-    logger = setup_logging(settings.out_dir, settings.log_level)
+    from .cluster import cluster as cluster_step
+
     init_db()
-    t0 = time.time()
-    cs = cluster_step(threshold=threshold, logger=logger)
-    dt = time.time() - t0
+    t0 = time.perf_counter()
+    cs = cluster_step(threshold=threshold, parallel=settings.parallel, logger=logger)
+    dt = time.perf_counter() - t0
     logger.info("Cluster done in %.2fs: %d clusters", dt, len(cs))
 
 
 @app.command()
-def summarize_cmd(
-    out: Optional[Path] = typer.Option(None),
-    since: Optional[str] = typer.Option(None),
-    max_items: Optional[int] = typer.Option(None),
-    dry_run: bool = typer.Option(False),
-    log_level: str = typer.Option("INFO"),
-    parallel: int = typer.Option(6),
-):
+@common_options
+def summarize_cmd(settings: CLISettings, logger: logging.Logger):
     """Summarize clusters with citations and watchdog tone."""
-    settings = _common_settings(out, since, max_items, dry_run, log_level, parallel)
-    logger = setup_logging(settings.out_dir, settings.log_level)
+    from .summarize import summarize
+
     init_db()
-    t0 = time.time()
+    t0 = time.perf_counter()
     _ = summarize(logger=logger)
-    dt = time.time() - t0
+    dt = time.perf_counter() - t0
     logger.info("Summarize done in %.2fs", dt)
 
 
-def _publish_internal(settings: CLISettings) -> None:
-    logger = setup_logging(settings.out_dir, settings.log_level)
+def _new_report() -> dict:
+    return {
+        "counts": {},
+        "durations": {},
+        "failures": [],
+        "rate_limit": {"per_host_rps": 2.0},
+    }
+
+
+def _write_report(settings: CLISettings, report: dict) -> None:
+    if not settings.dry_run:
+        write_json(settings.out_dir / "run_report.json", report)
+
+
+def _publish_internal(settings: CLISettings, logger: logging.Logger, report: dict | None = None) -> None:
+    # When run_all passes its report in, publish only adds to it and leaves
+    # the single final write to run_all.
+    from .rank import score_clusters
+    from .summarize import summarize
+
     init_db()
-    t0 = time.time()
-    summaries = summarize(logger=logger)
-    scores = score_clusters()
+    t0 = time.perf_counter()
+    with shared_db():
+        summaries = summarize(logger=logger)
+        scores = score_clusters()
     score_map = {s["cluster_id"]: s for s in scores}
     # Order summaries by score
     summaries_sorted = sorted(
@@ -125,21 +156,15 @@ def _publish_internal(settings: CLISettings) -> None:
         reverse=True,
     )
 
-    # Write clusters.json (summaries with scores)
+    # Build clusters.json (summaries with scores) and summaries.md in one pass
     clusters_json = settings.out_dir / "clusters.json"
     data = []
+    md_lines = ["# E‑Brain Bot Summaries\n"]
     for s in summaries_sorted:
         sc = score_map.get(s["cluster_id"], {"score": 0.0, "size": 0})
         row = dict(s)
         row.update(sc)
         data.append(row)
-    if not settings.dry_run:
-        clusters_json.write_text(json.dumps(data, indent=2), encoding="utf-8")
-
-    # Write summaries.md
-    md_lines = ["# E‑Brain Bot Summaries\n"]
-    for s in summaries_sorted:
-        sc = score_map.get(s["cluster_id"], {"score": 0.0, "size": 0})
         md_lines.append(
             f"\n## Cluster {s['cluster_id']} — score {sc['score']:.3f}, size {sc['size']}"
         )
@@ -151,57 +176,63 @@ def _publish_internal(settings: CLISettings) -> None:
                 f"- [{c['title']}]({c['url']}) — {c['outlet']} — {c['date']}"
             )
     if not settings.dry_run:
+        write_json(clusters_json, data)
         (settings.out_dir / "summaries.md").write_text(
             "\n".join(md_lines), encoding="utf-8"
         )
 
     # Run report
-    report = {
-        "counts": {"clusters": len(summaries_sorted)},
-        "durations": {"total_sec": time.time() - t0},
-        "failures": [],
-        "rate_limit": {"per_host_rps": 2.0},
-    }
-    if not settings.dry_run:
-        (settings.out_dir / "run_report.json").write_text(
-            json.dumps(report, indent=2), encoding="utf-8"
-        )
-    logger.info("Publish done in %.2fs -> %s", time.time() - t0, settings.out_dir)
+    if report is None:
+        own = _new_report()
+        own["counts"]["clusters"] = len(summaries_sorted)
+        own["durations"]["total_sec"] = time.perf_counter() - t0
+        _write_report(settings, own)
+    else:
+        report["counts"]["clusters"] = len(summaries_sorted)
+        report["durations"]["publish_sec"] = time.perf_counter() - t0
+    logger.info("Publish done in %.2fs -> %s", time.perf_counter() - t0, settings.out_dir)
 
 
 @app.command()
-def publish(
-    out: Optional[Path] = typer.Option(None),
-    since: Optional[str] = typer.Option(None),
-    max_items: Optional[int] = typer.Option(None),
-    dry_run: bool = typer.Option(False),
-    log_level: str = typer.Option("INFO"),
-    parallel: int = typer.Option(6),
-):
+@common_options
+def publish(settings: CLISettings, logger: logging.Logger):
     """Publish ranked summaries and artifacts to the run folder."""
-    settings = _common_settings(out, since, max_items, dry_run, log_level, parallel)
-    _publish_internal(settings)
+    _publish_internal(settings, logger)
 
 
 @app.command("all")
-def run_all(
-    out: Optional[Path] = typer.Option(None),
-    since: Optional[str] = typer.Option(None),
-    max_items: Optional[int] = typer.Option(None),
-    dry_run: bool = typer.Option(False),
-    log_level: str = typer.Option("INFO"),
-    parallel: int = typer.Option(6),
-):
+@common_options
+def run_all(settings: CLISettings, logger: logging.Logger):
     """Run fetch → extract → cluster → summarize → publish."""
-    settings = _common_settings(out, since, max_items, dry_run, log_level, parallel)
-    logger = setup_logging(settings.out_dir, settings.log_level)
+    from .cluster import cluster as cluster_step
+    from .extract import extract as extract_step
+    from .ingest import fetch_feeds
+
     init_db()
-    t0 = time.time()
-    fetch_feeds(since=settings.since, max_items=settings.max_items, logger=logger)
-    extract_step(limit=settings.max_items, parallel=settings.parallel, logger=logger)
-    cluster_step(logger=logger)
-    _publish_internal(settings)
-    logger.info("All done in %.2fs", time.time() - t0)
+    t0 = time.perf_counter()
+    # Stage metrics accumulate here and the report is written once, including
+    # when a stage fails part way.
+    report = _new_report()
+    counts, durations = report["counts"], report["durations"]
+    try:
+        with shared_db():
+            t = time.perf_counter()
+            counts.update(fetch_feeds(since=settings.since, max_items=settings.max_items, parallel=settings.parallel, logger=logger) or {})
+            durations["fetch_sec"] = time.perf_counter() - t
+            t = time.perf_counter()
+            counts["extracted"] = extract_step(limit=settings.max_items, parallel=settings.parallel, logger=logger)
+            durations["extract_sec"] = time.perf_counter() - t
+            t = time.perf_counter()
+            counts["clustered"] = len(cluster_step(parallel=settings.parallel, logger=logger))
+            durations["cluster_sec"] = time.perf_counter() - t
+            _publish_internal(settings, logger, report)
+    except Exception as e:  # noqa: BLE001
+        report["failures"].append(repr(e))
+        raise
+    finally:
+        durations["total_sec"] = time.perf_counter() - t0
+        _write_report(settings, report)
+    logger.info("All done in %.2fs", time.perf_counter() - t0)
 
 
 if __name__ == "__main__":
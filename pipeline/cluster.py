@@ -1,20 +1,48 @@
 from __future__ import annotations
 
-import difflib
 import hashlib
-import itertools
 import logging
-import math
+import os
+import string
+import struct
 import uuid
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any
 
-from .embed import ensure_embeddings_for_hashes, get_embedding_vector
-from .io import db, fetch_articles, put_cluster, put_cluster_members
+from .config import MAX_PARALLEL
+from .embed import ensure_embeddings_for_hashes, mean_vector
+from .io import db, fetch_articles_by_ids, fetch_embedding_vectors, iter_articles, load_signatures, put_clusters, put_memberships, put_signatures, transaction
+
+
+# MinHash/LSH candidate search. 32 bands of 4 rows put the LSH threshold near
+# (1/32) ** (1/4) ~= 0.42, below JACCARD_MIN, so true matches are rarely missed;
+# candidates are then confirmed on exact shingle-set Jaccard.
+MINHASH_PERMS = 128  # signature slots; a power of two so bins are the low bits
+LSH_BANDS = 32
+LSH_ROWS = MINHASH_PERMS // LSH_BANDS
+MINHASH_SHINGLE_K = 5
+JACCARD_MIN = 0.5
+_BIN_BITS = MINHASH_PERMS.bit_length() - 1
+_BIN_MASK = MINHASH_PERMS - 1
+_DENSIFY_STEP = 1 << (56 - _BIN_BITS)  # above any in-bin value, see minhash()
+# Signatures are kept packed as little-endian uint64 slots: about 1 KiB per
+# article instead of a tuple of 128 int objects, stored in article_signatures
+# as-is, and sliced per band into hashable bytes keys.
+_BAND_BYTES = LSH_ROWS * 8
+# Signatures are computed in worker processes from this many articles on;
+# below it, process start-up and pickling cost more than they save.
+SIGN_PARALLEL_MIN = 1000
+SIGN_CHUNKSIZE = 64
+# Bump whenever shingling or either signature changes, so cached signatures
+# in article_signatures are recomputed rather than compared against new ones.
+SIGNATURE_VERSION = 3
+# Punctuation becomes whitespace, so "results." and "results" shingle alike
+_PUNCT = str.maketrans(dict.fromkeys(string.punctuation, " "))
 
 
 def _shingles(text: str, k: int = 4) -> list[str]:
-    words = [w for w in text.lower().split() if w]
+    words = text.lower().translate(_PUNCT).split()
     if len(words) <= k:
         return [" ".join(words)] if words else []
     return [" ".join(words[i : i + k]) for i in range(len(words) - k + 1)]
@@ -22,92 +50,246 @@ def _shingles(text: str, k: int = 4) -> list[str]:
 
 def simhash64(text: str) -> int:
     # 64-bit simhash on shingles using deterministic hashing
-    bits = [0] * 64
-    for sh in _shingles(text):
-        h = hashlib.blake2b(sh.encode("utf-8"), digest_size=8)
-        hv = int.from_bytes(h.digest(), "big")
-        for i in range(64):
-            bits[i] += 1 if (hv >> i) & 1 else -1
-    out = 0
-    for i, b in enumerate(bits):
-        if b > 0:
-            out |= 1 << i
-    return out
+    shingles = _shingles(text)
+    if not shingles:
+        return 0
+    # Lay every shingle hash out as 64 binary digits in one string; the strided
+    # slice s[j::64] is then column j across all hashes, so the per-bit vote is
+    # counted in C instead of a 64-step Python loop per shingle. A bit is set
+    # when more than half the hashes have it (the +1/-1 sum is positive).
+    s = "".join(
+        format(int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+        for sh in shingles
+    )
+    n = len(shingles)
+    return int("".join("1" if 2 * s[j::64].count("1") > n else "0" for j in range(64)), 2)
 
 
 def hamming64(a: int, b: int) -> int:
     return ((a ^ b).bit_count())
 
 
-def _representative(article_list: list[dict[str, Any]]) -> dict[str, Any]:
+def shingle_set(text: str, k: int = MINHASH_SHINGLE_K) -> frozenset[int]:
+    # 56-bit shingle hashes; cheaper to intersect than the shingle strings
+    return frozenset(
+        int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=7).digest(), "big")
+        for sh in _shingles(text, k)
+    )
+
+
+def minhash(shingles: frozenset[int]) -> tuple[int, ...]:
+    # One-permutation MinHash: the low bits of each shingle hash pick one of
+    # MINHASH_PERMS bins and the rest is the value kept at its minimum, so a
+    # signature costs one pass over the shingles instead of one per
+    # permutation. Assigning in descending order leaves each bin's minimum.
+    if not shingles:
+        return ()
+    mins = {x & _BIN_MASK: x >> _BIN_BITS for x in sorted(shingles, reverse=True)}
+    if len(mins) == MINHASH_PERMS:
+        return tuple(mins[i] for i in range(MINHASH_PERMS))
+    # Densify by rotation: an empty bin borrows the next non-empty bin to its
+    # right, offset by the distance so borrowed values stay distinguishable.
+    sig = [0] * MINHASH_PERMS
+    nearest, dist = 0, 0
+    for i in range(2 * MINHASH_PERMS - 1, -1, -1):
+        v = mins.get(i & _BIN_MASK)
+        if v is not None:
+            nearest, dist = v, 0
+        else:
+            dist += 1
+        if i < MINHASH_PERMS:
+            sig[i] = nearest + dist * _DENSIFY_STEP
+    return tuple(sig)
+
+
+def _sign(text: str) -> tuple[int, bytes, int]:
+    # Top-level so worker processes can unpickle it. The shingle set is not
+    # returned: it is many times the size of the text it came from.
+    shingles = shingle_set(text)
+    sig = minhash(shingles)
+    return simhash64(text), struct.pack(f"<{len(sig)}Q", *sig), len(shingles)
+
+
+def _signatures(texts: list[str], parallel: int = MAX_PARALLEL) -> list[tuple[int, bytes, int]]:
+    workers = min(parallel, os.cpu_count() or 1)
+    if len(texts) < SIGN_PARALLEL_MIN or workers < 2:
+        return [_sign(t) for t in texts]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(_sign, texts, chunksize=SIGN_CHUNKSIZE))
+
+
+def _jaccard(a: frozenset[int], b: frozenset[int]) -> float:
+    inter = len(a & b)
+    union = len(a) + len(b) - inter
+    return inter / union if union else 0.0
+
+
+class _DisjointSet:
+    # Over 0..n-1, so articles are list indices rather than id-keyed dicts
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.rank = [0] * n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]  # path halving
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        # Union by rank: the shallower tree goes under the deeper one, keeping
+        # find() paths logarithmic even before halving flattens them
+        if self.rank[ra] < self.rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]:
+            self.rank[ra] += 1
+
+
+def _representative(members: list[str], text_len: dict[str, int]) -> str:
     # Choose the article with the longest text as representative
-    return max(article_list, key=lambda x: len(x.get("text") or ""))
+    return max(members, key=text_len.__getitem__)
 
 
-def cluster(threshold: int = 8, logger: logging.Logger | None = None) -> list[dict[str, Any]]:
+def cluster(threshold: int = 8, parallel: int = MAX_PARALLEL, logger: logging.Logger | None = None) -> list[dict[str, Any]]:
+    # Articles are streamed and their text dropped as soon as possible: only
+    # texts still to be signed are held, everything else keeps its metadata.
+    by_id: dict[str, dict[str, Any]] = {}
+    text_len: dict[str, int] = {}
+    pending: dict[str, str] = {}
     with db() as conn:
-        arts = fetch_articles(conn)
-    if not arts:
+        # Signatures depend only on the text, so they are cached by content
+        # hash and computed (see _signatures()) only for texts not seen before.
+        cached = load_signatures(conn, None, SIGNATURE_VERSION)
+        sims: dict[str, int] = {}
+        sigs: dict[str, bytes] = {}
+        sizes: dict[str, int] = {}  # shingle-set sizes, for length filtering
+        for a in iter_articles(conn):
+            aid = a["article_id"]
+            text = a.pop("text") or ""
+            by_id[aid] = a
+            text_len[aid] = len(text)
+            if a.get("content_hash") in cached:
+                sims[aid], sigs[aid], sizes[aid] = cached[a["content_hash"]]
+            else:
+                pending[aid] = text
+    if not by_id:
         if logger:
             logger.info("No articles to cluster.")
         return []
 
-    # Precompute simhash for each article
-    sims: dict[str, int] = {}
-    for a in arts:
-        sims[a["article_id"]] = simhash64(a.get("text") or "")
-
-    # Greedy clustering by hamming distance and canonical URL equality
-    unassigned = set(a["article_id"] for a in arts)
-    clusters: list[list[str]] = []
-    by_id = {a["article_id"]: a for a in arts}
-
-    while unassigned:
-        seed = unassigned.pop()
-        group = [seed]
-        seed_sim = sims[seed]
-        seed_url = by_id[seed].get("canonical_url")
-        to_check = list(unassigned)
-        for aid in to_check:
-            if by_id[aid].get("canonical_url") == seed_url:
-                group.append(aid)
-                unassigned.remove(aid)
-                continue
-            dist = hamming64(seed_sim, sims[aid])
-            if dist <= threshold or difflib.SequenceMatcher(
-                None,
-                by_id[seed].get("text") or "",
-                by_id[aid].get("text") or "",
-            ).ratio() > 0.6:
-                group.append(aid)
-                unassigned.remove(aid)
-        clusters.append(group)
+    # Articles are numbered in id order; the union-find and all buckets
+    # work on these indices, which keeps cluster output independent of row order
+    ids = sorted(by_id)
+    ds = _DisjointSet(len(ids))
+
+    # Same canonical URL: grouped without any text comparison
+    by_url: dict[str, int] = {}
+    for i, aid in enumerate(ids):
+        url = by_id[aid].get("canonical_url")
+        if url:
+            ds.union(by_url.setdefault(url, i), i)
+
+    # Texts are released once signed
+    signed = list(pending)
+    for aid, (sim, sig, size) in zip(signed, _signatures(list(pending.values()), parallel)):
+        sims[aid], sigs[aid], sizes[aid] = sim, sig, size
+    del pending
+    with db() as conn:
+        put_signatures(
+            conn,
+            [(by_id[aid]["content_hash"], sims[aid], sigs[aid], sizes[aid]) for aid in signed if by_id[aid].get("content_hash")],
+            SIGNATURE_VERSION,
+        )
+
+    # Near-duplicate text: simhash within the Hamming threshold. Split into
+    # threshold + 1 bit blocks, two hashes that close must agree exactly on at
+    # least one block (pigeonhole), so only hashes sharing a block value are
+    # compared rather than all pairs. A negative threshold matches nothing.
+    sim_of = [sims[aid] for aid in ids]
+    n_blocks = min(64, threshold + 1)
+    edges = [64 * i // n_blocks for i in range(n_blocks + 1)] if threshold >= 0 else []
+    for lo, hi in zip(edges, edges[1:]):
+        mask = (1 << (hi - lo)) - 1
+        blocks: dict[int, list[int]] = defaultdict(list)
+        for i, sim in enumerate(sim_of):
+            blocks[(sim >> lo) & mask].append(i)
+        for bucket in blocks.values():
+            for j, a in enumerate(bucket):
+                for b in bucket[j + 1 :]:
+                    if ds.find(a) != ds.find(b) and hamming64(sim_of[a], sim_of[b]) <= threshold:
+                        ds.union(a, b)
+
+    # Reworded coverage: MinHash signatures bucketed per band, so only
+    # articles sharing a band are compared instead of every pair
+    size_of = [sizes[aid] for aid in ids]
+    buckets: dict[tuple[int, bytes], list[int]] = defaultdict(list)
+    for i, aid in enumerate(ids):
+        sig = sigs[aid]
+        if not sig:
+            continue
+        for band in range(LSH_BANDS):
+            buckets[(band, sig[band * _BAND_BYTES : (band + 1) * _BAND_BYTES])].append(i)
+    shingles: dict[str, frozenset[int]] = {}
+    with db() as conn:
+
+        def shingles_of(i: int) -> frozenset[int]:
+            # Text is read back and shingled only for articles in a candidate
+            # pair that needs verifying
+            aid = ids[i]
+            if aid not in shingles:
+                (row,) = fetch_articles_by_ids(conn, [aid])
+                shingles[aid] = shingle_set(row.get("text") or "")
+            return shingles[aid]
+
+        for bucket in buckets.values():
+            # Jaccard can be at most |A| / |B| for |A| <= |B|. With each bucket
+            # ordered by size, the scan for a partner stops at the first one
+            # too large to reach JACCARD_MIN, before any text is read.
+            bucket.sort(key=size_of.__getitem__)
+            for j, a in enumerate(bucket):
+                for b in bucket[j + 1 :]:
+                    if size_of[a] < JACCARD_MIN * size_of[b]:
+                        break
+                    # Pairs already joined (directly or transitively) need no check
+                    if ds.find(a) != ds.find(b) and _jaccard(shingles_of(a), shingles_of(b)) >= JACCARD_MIN:
+                        ds.union(a, b)
+
+    # Ids are sorted, so members come out sorted and clusters are ordered by
+    # their smallest member id
+    groups: dict[int, list[str]] = defaultdict(list)
+    for i, aid in enumerate(ids):
+        groups[ds.find(i)].append(aid)
+    clusters = list(groups.values())
 
     # Compute embeddings centroid (ensure cached first)
-    content_hashes = [a.get("content_hash") for a in arts if a.get("content_hash")]
+    content_hashes = [a["content_hash"] for a in by_id.values() if a.get("content_hash")]
     ensure_embeddings_for_hashes(content_hashes, logger=logger)
 
-    # Persist clusters
+    # Persist clusters: rows are gathered first and written in one transaction
     saved = []
+    cluster_rows = []
+    member_rows = []
     with db() as conn:
+        # Every member vector in one query rather than one lookup per article
+        vectors = fetch_embedding_vectors(conn, content_hashes)
         for members in clusters:
             articles = [by_id[m] for m in members]
-            rep = _representative(articles)
+            rep = by_id[_representative(members, text_len)]
             cluster_id = uuid.uuid5(uuid.NAMESPACE_URL, rep.get("canonical_url") or rep.get("article_id")).hex[:16]
             # centroid: average of vectors for members with embeddings
-            vecs = []
-            for a in articles:
-                v = get_embedding_vector(conn, a.get("content_hash"))
-                if v:
-                    vecs.append(v)
-            centroid = None
-            if vecs:
-                # average pool
-                dims = len(vecs[0])
-                centroid = [sum(v[i] for v in vecs) / len(vecs) for i in range(dims)]
-            put_cluster(conn, cluster_id, method="simhash+embed", centroid_embed=centroid, representative_article_id=rep["article_id"])
-            put_cluster_members(conn, cluster_id, members)
+            vecs = [vectors[a["content_hash"]] for a in articles if a.get("content_hash") in vectors]
+            centroid = mean_vector(vecs) if vecs else None
+            cluster_rows.append((cluster_id, "simhash+embed", centroid, rep["article_id"]))
+            member_rows.extend((cluster_id, m) for m in members)
             saved.append({"cluster_id": cluster_id, "members": members, "representative_article_id": rep["article_id"]})
+        with transaction(conn):
+            put_clusters(conn, cluster_rows)
+            put_memberships(conn, member_rows)
     if logger:
         logger.info("Created %d clusters", len(saved))
     return saved
@@ -3,10 +3,22 @@ from __future__ import annotations
 import math
 import os
 import random
-from typing import Any, Iterable
+from functools import lru_cache
+from typing import Iterable
 
 from .config import EMBED_DIMS, EMBED_MODEL
-from .io import db, get_embedding, put_embedding
+from .io import HASHES_PER_SELECT, db, decode_vector, get_embedding, put_embeddings
+
+# Computed vectors are persisted in batches of this size, so a failure part
+# way through a large run keeps (and does not re-pay for) what was embedded.
+EMBED_FLUSH_EVERY = 64
+# Chunks sent per embeddings request; ~1k tokens each keeps a request well
+# inside the API's per-request input and token limits.
+EMBED_REQUEST_INPUTS = 128
+APPROX_CHUNK_CHARS = 4000  # crude proxy for the model's token window
+# Recorded as the model of stub vectors so they are recomputed, not reused,
+# once a real API key is configured.
+OFFLINE_MODEL = "offline-stub"
 
 
 def _norm(vec: list[float]) -> list[float]:
@@ -14,6 +26,13 @@ def _norm(vec: list[float]) -> list[float]:
     return [x / s for x in vec]
 
 
+def mean_vector(vecs: list[list[float]]) -> list[float]:
+    # Column-wise mean; zip(*vecs) transposes in C instead of indexing v[i]
+    # from Python for every dimension of every vector.
+    n = len(vecs)
+    return [sum(col) / n for col in zip(*vecs)]
+
+
 def _offline_embed_stub(text: str, dims: int = EMBED_DIMS) -> list[float]:
     # Deterministic pseudo-embedding based on text hash; good for tests/offline
     seed = abs(hash(text)) % (2**32)
@@ -22,69 +41,86 @@ def _offline_embed_stub(text: str, dims: int = EMBED_DIMS) -> list[float]:
     return _norm(vec)
 
 
-def _embed_openai_chunks(chunks: list[str], model: str = EMBED_MODEL) -> list[list[float]]:
-    # Lazy import to avoid dependency at import time
+@lru_cache(maxsize=1)
+def _openai_client(api_key: str):
+    # Lazy import to avoid dependency at import time. Cached so every request
+    # reuses one client and its keep-alive connection pool; keyed on the key
+    # so a rotated OPENAI_API_KEY still takes effect.
     from openai import OpenAI  # type: ignore
 
+    return OpenAI(api_key=api_key)
+
+
+def _offline() -> bool:
+    return os.getenv("EMBED_OFFLINE") == "1" or not os.getenv("OPENAI_API_KEY")
+
+
+def active_model(model: str = EMBED_MODEL) -> str:
+    return OFFLINE_MODEL if _offline() else model
+
+
+def _embed_openai_chunks(chunks: list[str], model: str = EMBED_MODEL) -> list[list[float]]:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY not set")
-    client = OpenAI(api_key=api_key)
+    client = _openai_client(api_key)
     res = client.embeddings.create(model=model, input=chunks)
     return [d.embedding for d in res.data]
 
 
-def embed_text(text: str, model: str = EMBED_MODEL, dims: int = EMBED_DIMS) -> list[float]:
-    # Split into ~4000 token chunks (approx by chars)
-    if not text:
-        return [0.0] * dims
-    approx_chunk_chars = 4000  # crude proxy
-    chunks = [text[i : i + approx_chunk_chars] for i in range(0, len(text), approx_chunk_chars)]
-    if os.getenv("EMBED_OFFLINE") == "1" or not os.getenv("OPENAI_API_KEY"):
+def embed_texts(texts: list[str], model: str = EMBED_MODEL, dims: int = EMBED_DIMS) -> list[list[float]]:
+    # Chunk every text, embed all chunks in as few requests as possible, then
+    # average-pool each text's chunks back into one normalized vector.
+    chunks: list[str] = []
+    spans: list[tuple[int, int]] = []
+    for text in texts:
+        start = len(chunks)
+        if text:
+            chunks.extend(text[i : i + APPROX_CHUNK_CHARS] for i in range(0, len(text), APPROX_CHUNK_CHARS))
+        spans.append((start, len(chunks)))
+    if _offline():
         vecs = [_offline_embed_stub(c, dims=dims) for c in chunks]
     else:
-        vecs = _embed_openai_chunks(chunks, model=model)
-    if not vecs:
-        return [0.0] * dims
-    # Average pool to single vector
-    dims0 = len(vecs[0])
-    out = [sum(v[i] for v in vecs) / len(vecs) for i in range(dims0)]
-    return _norm(out)
+        vecs = []
+        for i in range(0, len(chunks), EMBED_REQUEST_INPUTS):
+            vecs.extend(_embed_openai_chunks(chunks[i : i + EMBED_REQUEST_INPUTS], model=model))
+    return [_norm(mean_vector(vecs[a:b])) if b > a else [0.0] * dims for a, b in spans]
+
+
+def embed_text(text: str, model: str = EMBED_MODEL, dims: int = EMBED_DIMS) -> list[float]:
+    return embed_texts([text], model=model, dims=dims)[0]
 
 
 def ensure_embeddings_for_hashes(content_hashes: Iterable[str], logger=None) -> int:
     done = 0
-    # Build a map from content_hash to text via articles if needed
-    from .io import db as _db
-
-    with _db() as conn:
-        # fetch article text per content_hash
-        placeholders = ",".join(["?"] * len(list(content_hashes)))
-        # Re-materialize iterable as list (content_hashes may be generator)
+    # Materialize once; content_hashes may be a generator
     ch_list = list(dict.fromkeys(content_hashes))
     if not ch_list:
         return 0
+    model = active_model()
     with db() as conn:
-        if len(ch_list) == 1:
-            where = "content_hash = ?"
-        else:
-            where = f"content_hash IN ({','.join(['?']*len(ch_list))})"
-        cur = conn.execute(f"SELECT content_hash, text FROM articles WHERE {where}", ch_list)
-        text_by_hash = {r["content_hash"]: r["text"] for r in cur.fetchall()}
-
-    for ch in ch_list:
-        with db() as conn:
-            if get_embedding(conn, ch):
-                continue
-        txt = text_by_hash.get(ch)
-        if not txt:
-            continue
-        vec = embed_text(txt)
-        with db() as conn:
-            put_embedding(conn, ch, EMBED_MODEL, len(vec), vec)
-        done += 1
-        if logger:
-            logger.debug("Embedded %s", ch[:8])
+        # Only hashes with no stored vector from the current model, decided in
+        # the same query rather than one embeddings lookup per hash; one query
+        # per HASHES_PER_SELECT hashes
+        text_by_hash: dict[str, str] = {}
+        for i in range(0, len(ch_list), HASHES_PER_SELECT):
+            chunk = ch_list[i : i + HASHES_PER_SELECT]
+            placeholders = ",".join(["?"] * len(chunk))
+            cur = conn.execute(
+                f"SELECT a.content_hash, a.text FROM articles a WHERE a.content_hash IN ({placeholders}) "
+                "AND NOT EXISTS (SELECT 1 FROM embeddings e WHERE e.content_hash = a.content_hash AND e.model = ?)",
+                [*chunk, model],
+            )
+            text_by_hash.update((r["content_hash"], r["text"]) for r in cur.fetchall())
+        todo = [(ch, text_by_hash[ch]) for ch in ch_list if text_by_hash.get(ch)]
+
+        for i in range(0, len(todo), EMBED_FLUSH_EVERY):
+            batch = todo[i : i + EMBED_FLUSH_EVERY]
+            vecs = embed_texts([txt for _, txt in batch])
+            put_embeddings(conn, [(ch, model, len(v), v) for (ch, _), v in zip(batch, vecs)])
+            done += len(batch)
+            if logger:
+                logger.debug("Embedded %d articles", len(batch))
     return done
 
 
@@ -95,7 +131,7 @@ def get_embedding_vector(conn, content_hash: str | None) -> list[float] | None:
     if not row:
         return None
     try:
-        return [float(x) for x in (row["vector"] and __import__("json").loads(row["vector"]))]
+        return decode_vector(row["vector"])
     except Exception:  # noqa: BLE001
         return None
 
@@ -1,13 +1,13 @@
 from __future__ import annotations
 
-import json
 import logging
+import sqlite3
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any
 
 import trafilatura
 
-from .io import Article, db, fetch_unextracted_raws, upsert_article
+from .io import Article, db, fetch_unextracted_raws, mark_raw_extracted, transaction, upsert_article
 from .normalize import canonicalize_url, clean_text, content_hash, is_preprint_source, parse_date
 
 
@@ -15,15 +15,12 @@ def _extract_from_url(url: str) -> tuple[str | None, dict[str, Any] | None]:
     downloaded = trafilatura.fetch_url(url)
     if not downloaded:
         return None, None
-    data_json = trafilatura.extract(downloaded, include_links=False, output="json")
-    if not data_json:
-        # Try plain text
-        txt = trafilatura.extract(downloaded, include_links=False, output=None)
-        return (txt or None), None
-    try:
-        data = json.loads(data_json)
-    except Exception:  # noqa: BLE001
+    # One parse yields both the text and the metadata; trafilatura >= 2 returns
+    # a Document, older releases a plain dict.
+    doc = trafilatura.bare_extraction(downloaded, include_links=False, with_metadata=True)
+    if not doc:
         return None, None
+    data = doc.as_dict() if hasattr(doc, "as_dict") else dict(doc)
     txt = data.get("text") or data.get("raw_text")
     return (txt or None), data
 
@@ -37,11 +34,11 @@ def extract(limit: int | None = None, parallel: int = 4, logger: logging.Logger
             logger.info("No new raw articles to extract.")
         return 0
 
-    def worker(raw: dict[str, Any]) -> int:
+    def worker(raw: dict[str, Any]) -> Article | None:
         url = raw.get("link") or ""
         text, meta = _extract_from_url(url)
         if not text:
-            return 0
+            return None
         canonical = None
         if meta:
             canonical = meta.get("url") or meta.get("source") or None
@@ -73,18 +70,34 @@ def extract(limit: int | None = None, parallel: int = 4, logger: logging.Logger
             extraction_quality=quality,
             content_hash=chash,
         )
-        with db() as conn2:
-            upsert_article(conn2, art)
-        return 1
+        return art
 
-    with ThreadPoolExecutor(max_workers=max(1, parallel)) as ex:
-        futures = [ex.submit(worker, r) for r in raws]
+    # Workers only download and parse; rows are written here on one connection.
+    # Each article commits on its own, so the write lock is never held across
+    # downloads and an interrupted run keeps what it already extracted.
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as ex, db() as conn:
+        futures = {ex.submit(worker, r): r for r in raws}
         for fut in as_completed(futures):
             try:
-                count += fut.result()
+                art = fut.result()
             except Exception as e:  # noqa: BLE001
                 if logger:
                     logger.error("Extraction error: %s", e)
+                continue
+            if art is None:
+                continue
+            raw = futures[fut]
+            try:
+                with transaction(conn):
+                    upsert_article(conn, art)
+                    # Raw titles/dates rarely match the normalized article row, so
+                    # record the mapping explicitly to avoid re-downloading next run.
+                    mark_raw_extracted(conn, raw["entry_id"], raw["feed_url"], art.article_id)
+            except sqlite3.Error as e:
+                if logger:
+                    logger.error("Extraction error: %s", e)
+                continue
+            count += 1
     if logger:
         logger.info("Extracted %d articles", count)
     return count
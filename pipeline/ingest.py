@@ -1,17 +1,22 @@
 from __future__ import annotations
 
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from typing import Any
 
 import feedparser
 import requests
 import yaml
+from requests.adapters import HTTPAdapter
 from tenacity import RetryError, retry, stop_after_attempt, wait_exponential_jitter
 
-from .config import CONNECT_TIMEOUT, READ_TIMEOUT, DEFAULT_RPS_PER_HOST
-from .io import ArticleRaw, db, get_feed_cache, init_db, insert_raw_articles, upsert_feed_cache
+from . import __version__
+from .config import CONNECT_TIMEOUT, READ_TIMEOUT, DEFAULT_RPS_PER_HOST, MAX_PARALLEL
+from .io import ArticleRaw, db, get_feed_cache, init_db, insert_raw_articles, transaction, upsert_feed_cache
 
 
 @dataclass
@@ -35,35 +40,104 @@ class RateLimiter:
     def __init__(self, rps: float = DEFAULT_RPS_PER_HOST):
         self.min_interval = 1.0 / max(0.1, rps)
         self.last: dict[str, float] = {}
+        self._lock = threading.Lock()
 
     def wait(self, host: str) -> None:
-        now = time.monotonic()
-        last = self.last.get(host, 0.0)
-        delta = now - last
-        if delta < self.min_interval:
-            time.sleep(self.min_interval - delta)
-        self.last[host] = time.monotonic()
+        # Reserve the next slot for this host under the lock, then sleep outside
+        # it so concurrent fetches to other hosts are not serialized.
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self.last.get(host, 0.0) + self.min_interval)
+            self.last[host] = slot
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def defer(self, host: str, seconds: float) -> None:
+        # Push the host's next slot out so every pending and later request to
+        # it waits, not only the one that was told to back off.
+        with self._lock:
+            until = time.monotonic() + seconds - self.min_interval
+            self.last[host] = max(self.last.get(host, 0.0), until)
+
+
+def _mount_pool(pool_maxsize: int) -> None:
+    # One keep-alive pool per host, sized so parallel fetch workers reuse
+    # connections instead of opening (and discarding) extra ones.
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max(1, pool_maxsize))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
 
 
 session = requests.Session()
+session.headers["User-Agent"] = f"e-brain-bot-pipeline/{__version__}"
+_mount_pool(MAX_PARALLEL)
 limiter = RateLimiter()
 
+# Statuses whose Retry-After header is honoured, and the longest wait accepted
+_BACKOFF_STATUSES = (429, 503)
+MAX_RETRY_AFTER = 30.0
+
+# Entry attributes tried, in order, as the per-feed identity of an item.
+_ENTRY_ID_ATTRS = ("id", "guid", "link")
+
+
+def _entry_id(ent: Any) -> str | None:
+    for attr in _ENTRY_ID_ATTRS:
+        v = getattr(ent, attr, None)
+        if v:
+            return v if type(v) is str else str(v)
+    return None
+
+
+def _retry_after(value: str | None) -> float | None:
+    # Retry-After is either delta-seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
 
 @retry(wait=wait_exponential_jitter(initial=1, max=8), stop=stop_after_attempt(3))
 def _get(url: str, headers: dict[str, str]) -> requests.Response:
     host = requests.utils.urlparse(url).hostname or ""
     limiter.wait(host)
     resp = session.get(url, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    if resp.status_code in _BACKOFF_STATUSES:
+        delay = _retry_after(resp.headers.get("Retry-After"))
+        if delay:
+            limiter.defer(host, delay)
     resp.raise_for_status()
     return resp
 
 
-def fetch_feeds(since: datetime | None = None, max_items: int | None = None, logger=None) -> dict[str, Any]:
+def _fetch_feed(url: str, headers: dict[str, str]) -> tuple[requests.Response, Any]:
+    resp = _get(url, headers=headers)
+    return resp, feedparser.parse(resp.content)
+
+
+def fetch_feeds(
+    since: datetime | None = None,
+    max_items: int | None = None,
+    parallel: int = MAX_PARALLEL,
+    logger=None,
+) -> dict[str, Any]:
     init_db()
     sources = load_sources()
     totals = {"feeds": 0, "entries": 0, "inserted": 0}
     fetched_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-    with db() as conn:
+    # --parallel may exceed the import-time pool size
+    _mount_pool(parallel)
+    with db() as conn, ThreadPoolExecutor(max_workers=max(1, parallel)) as ex:
+        # Network and feed parsing run in the pool; all SQLite access stays on
+        # this thread.
+        futures = {}
         for src in sources:
             totals["feeds"] += 1
             etag, last_mod = get_feed_cache(conn, src.url)
@@ -72,12 +146,12 @@ def fetch_feeds(since: datetime | None = None, max_items: int | None = None, log
                 headers["If-None-Match"] = etag
             if last_mod:
                 headers["If-Modified-Since"] = last_mod
+            futures[ex.submit(_fetch_feed, src.url, headers)] = (src, etag, last_mod)
+
+        for fut in as_completed(futures):
+            src, etag, last_mod = futures[fut]
             try:
-                resp = _get(src.url, headers=headers)
-                etag_new = resp.headers.get("ETag")
-                last_mod_new = resp.headers.get("Last-Modified")
-                content = resp.content
-                upsert_feed_cache(conn, src.url, src.id, etag_new, last_mod_new)
+                resp, feed = fut.result()
                 if logger:
                     logger.info("Fetched %s (%s)", src.id, resp.status_code)
             except RetryError as e:
@@ -93,22 +167,22 @@ def fetch_feeds(since: datetime | None = None, max_items: int | None = None, log
                     logger.error("HTTP error on %s: %s", src.id, e)
                 continue
 
-            feed = feedparser.parse(content)
             entries = []
+            entries_append = entries.append
             for ent in feed.entries:
                 totals["entries"] += 1
                 if since and hasattr(ent, "published_parsed") and ent.published_parsed:
                     pub_dt = datetime(*ent.published_parsed[:6], tzinfo=timezone.utc)
                     if pub_dt < since:
                         continue
-                entry_id = getattr(ent, "id", None) or getattr(ent, "guid", None) or getattr(ent, "link", "")
+                entry_id = _entry_id(ent)
                 if not entry_id:
                     continue
-                entries.append(
+                entries_append(
                     ArticleRaw(
                         source_id=src.id,
                         feed_url=src.url,
-                        entry_id=str(entry_id),
+                        entry_id=entry_id,
                         link=getattr(ent, "link", ""),
                         title=getattr(ent, "title", None),
                         summary=getattr(ent, "summary", None),
@@ -120,9 +194,12 @@ def fetch_feeds(since: datetime | None = None, max_items: int | None = None, log
                 )
                 if max_items and len(entries) >= max_items:
                     break
-            inserted = insert_raw_articles(conn, entries)
+            # Cache validators and entries commit together: one commit per feed,
+            # and a new ETag is never stored without the entries it covers.
+            with transaction(conn):
+                upsert_feed_cache(conn, src.url, src.id, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+                inserted = insert_raw_articles(conn, entries)
             totals["inserted"] += inserted
             if logger:
                 logger.info("%s: %d new raw entries", src.id, inserted)
     return totals
-
@@ -3,15 +3,21 @@ from __future__ import annotations
 import json
 import os
 import sqlite3
+import struct
 import threading
 from contextlib import contextmanager
-from dataclasses import asdict, dataclass
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator
 
 from .config import DB_PATH, ensure_dirs
 
+try:
+    import orjson  # type: ignore
+except Exception:  # noqa: BLE001
+    orjson = None  # type: ignore
+
 
 _lock = threading.Lock()
 
@@ -23,15 +29,36 @@ def _dict_factory(cursor: sqlite3.Cursor, row: tuple[Any, ...]) -> dict[str, Any
     return d
 
 
+# Per-connection settings; journal_mode=WAL is persistent and set in init_db.
+# Under WAL, synchronous=NORMAL only syncs at checkpoints rather than on every
+# commit, and stays crash-safe. The lock timeout comes from connect(timeout=).
+_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+
 def _connect() -> sqlite3.Connection:
     ensure_dirs()
     conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None, check_same_thread=False)
     conn.row_factory = _dict_factory
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+_shared = threading.local()
+
+
 @contextmanager
 def db() -> Iterable[sqlite3.Connection]:
+    # Inside shared_db() every call on that thread reuses its connection
+    shared = getattr(_shared, "conn", None)
+    if shared is not None:
+        yield shared
+        return
     conn = _connect()
     try:
         yield conn
@@ -39,7 +66,50 @@ def db() -> Iterable[sqlite3.Connection]:
         conn.close()
 
 
+@contextmanager
+def shared_db() -> Iterable[sqlite3.Connection]:
+    # Keep one connection open for a whole multi-stage run instead of
+    # connecting (and re-applying pragmas) in every stage helper. Nested use
+    # joins the outer block.
+    if getattr(_shared, "conn", None) is not None:
+        yield _shared.conn
+        return
+    conn = _connect()
+    _shared.conn = conn
+    try:
+        yield conn
+    finally:
+        _shared.conn = None
+        conn.close()
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterable[sqlite3.Connection]:
+    # Connections run in autocommit mode, so every statement (and every row of an
+    # executemany) would otherwise commit on its own. Nested use joins the
+    # enclosing transaction.
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+# Database files whose schema this process has already created. Each CLI
+# stage (and fetch_feeds within it) calls init_db; the DDL only needs to run
+# once per file.
+_initialized: set[str] = set()
+
+
 def init_db() -> None:
+    key = str(DB_PATH)
+    if key in _initialized and os.path.exists(key):
+        return
     with db() as conn, _lock:
         c = conn.cursor()
         c.executescript(
@@ -66,6 +136,14 @@ def init_db() -> None:
                 PRIMARY KEY (entry_id, feed_url)
             );
 
+            -- Raw entries already extracted, so later runs skip re-downloading them
+            CREATE TABLE IF NOT EXISTS extracted_raws (
+                entry_id TEXT,
+                feed_url TEXT,
+                article_id TEXT,
+                PRIMARY KEY (entry_id, feed_url)
+            );
+
             CREATE TABLE IF NOT EXISTS articles (
                 article_id TEXT PRIMARY KEY,
                 canonical_url TEXT,
@@ -81,6 +159,10 @@ def init_db() -> None:
                 content_hash TEXT UNIQUE
             );
 
+            -- Backs the raw_articles -> articles join in fetch_unextracted_raws
+            CREATE INDEX IF NOT EXISTS idx_articles_source_title_published
+                ON articles(source_id, title, published_at);
+
             CREATE TABLE IF NOT EXISTS embeddings (
                 content_hash TEXT PRIMARY KEY,
                 model TEXT,
@@ -88,6 +170,16 @@ def init_db() -> None:
                 vector TEXT
             );
 
+            -- Per-text simhash/MinHash cache; rows from an older signature
+            -- version are ignored and overwritten
+            CREATE TABLE IF NOT EXISTS article_signatures (
+                content_hash TEXT PRIMARY KEY,
+                version INTEGER,
+                simhash INTEGER,
+                minhash BLOB,
+                shingle_count INTEGER
+            );
+
             CREATE TABLE IF NOT EXISTS clusters (
                 cluster_id TEXT PRIMARY KEY,
                 method TEXT,
@@ -103,6 +195,7 @@ def init_db() -> None:
             );
             """
         )
+    _initialized.add(key)
 
 
 # Feed cache
@@ -127,6 +220,8 @@ def upsert_feed_cache(conn: sqlite3.Connection, feed_url: str, source_id: str, e
 
 
 # Raw articles
+# Row dataclasses are bound to SQL by name through vars(); dataclasses.asdict
+# would deep-copy every field of every row.
 @dataclass
 class ArticleRaw:
     source_id: str
@@ -142,13 +237,15 @@ class ArticleRaw:
 
 
 def insert_raw_articles(conn: sqlite3.Connection, raws: list[ArticleRaw]) -> int:
-    with _lock:
+    if not raws:
+        return 0
+    with _lock, transaction(conn):
         cur = conn.executemany(
             """
             INSERT OR IGNORE INTO raw_articles(entry_id, feed_url, source_id, link, title, summary, published_at, fetched_at, etag, last_modified)
             VALUES(:entry_id,:feed_url,:source_id,:link,:title,:summary,:published_at,:fetched_at,:etag,:last_modified)
             """,
-            [asdict(r) for r in raws],
+            [vars(r) for r in raws],
         )
         return cur.rowcount or 0
 
@@ -157,12 +254,21 @@ def fetch_unextracted_raws(conn: sqlite3.Connection, limit: int | None = None) -
     sql = (
         "SELECT ra.* FROM raw_articles ra "
         "LEFT JOIN articles a ON a.source_id = ra.source_id AND a.title = ra.title AND a.published_at = ra.published_at "
-        "WHERE a.article_id IS NULL"
+        "WHERE a.article_id IS NULL "
+        "AND NOT EXISTS (SELECT 1 FROM extracted_raws x WHERE x.entry_id = ra.entry_id AND x.feed_url = ra.feed_url)"
     )
     if limit:
         sql += f" LIMIT {int(limit)}"
     cur = conn.execute(sql)
-    return list(cur.fetchall())
+    return cur.fetchall()
+
+
+def mark_raw_extracted(conn: sqlite3.Connection, entry_id: str, feed_url: str, article_id: str) -> None:
+    with _lock:
+        conn.execute(
+            "INSERT OR IGNORE INTO extracted_raws(entry_id, feed_url, article_id) VALUES(?,?,?)",
+            (entry_id, feed_url, article_id),
+        )
 
 
 # Articles
@@ -182,22 +288,29 @@ class Article:
     content_hash: str
 
 
+# More than one ON CONFLICT clause per INSERT needs SQLite 3.35+. Older system
+# libraries check for a duplicate content_hash with a SELECT first instead.
+_MULTI_UPSERT = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
 def upsert_article(conn: sqlite3.Connection, article: Article) -> None:
     with _lock:
-        # Avoid raising an IntegrityError for duplicate content by checking the
-        # unique ``content_hash`` ahead of time. This prevents noisy tracebacks
-        # when different feeds return the same article text.
-        if conn.execute(
-            "SELECT 1 FROM articles WHERE content_hash=?",
-            (article.content_hash,),
-        ).fetchone():
-            # An article with identical content already exists; skip insert.
-            return
+        # Different feeds often return the same article text. Where supported,
+        # the first ON CONFLICT clause skips a row whose unique ``content_hash``
+        # already exists, in the same statement rather than a separate SELECT,
+        # so duplicates neither raise nor cost an extra query.
+        if _MULTI_UPSERT:
+            skip_duplicate = "ON CONFLICT(content_hash) DO NOTHING"
+        else:
+            skip_duplicate = ""
+            if conn.execute("SELECT 1 FROM articles WHERE content_hash=?", (article.content_hash,)).fetchone():
+                return
         try:
             conn.execute(
-                """
+                f"""
                 INSERT INTO articles(article_id, canonical_url, title, byline, published_at, source_id, is_preprint, text, lang, tags, extraction_quality, content_hash)
                 VALUES(:article_id,:canonical_url,:title,:byline,:published_at,:source_id,:is_preprint,:text,:lang,:tags,:extraction_quality,:content_hash)
+                {skip_duplicate}
                 ON CONFLICT(article_id) DO UPDATE SET
                     canonical_url=excluded.canonical_url,
                     title=excluded.title,
@@ -211,7 +324,7 @@ def upsert_article(conn: sqlite3.Connection, article: Article) -> None:
                     extraction_quality=excluded.extraction_quality,
                     content_hash=excluded.content_hash
                 """,
-                asdict(article),
+                vars(article),
             )
         except sqlite3.IntegrityError as e:
             # A race condition may still trigger a UNIQUE constraint violation
@@ -223,7 +336,14 @@ def upsert_article(conn: sqlite3.Connection, article: Article) -> None:
 
 def fetch_articles(conn: sqlite3.Connection) -> list[dict[str, Any]]:
     cur = conn.execute("SELECT * FROM articles")
-    return list(cur.fetchall())
+    return cur.fetchall()
+
+
+def iter_articles(conn: sqlite3.Connection, batch_size: int = 1000) -> Iterator[dict[str, Any]]:
+    # Streams rows so callers can drop each text once they are done with it
+    cur = conn.execute("SELECT * FROM articles")
+    while rows := cur.fetchmany(batch_size):
+        yield from rows
 
 
 def fetch_articles_by_ids(conn: sqlite3.Connection, ids: list[str]) -> list[dict[str, Any]]:
@@ -231,55 +351,197 @@ def fetch_articles_by_ids(conn: sqlite3.Connection, ids: list[str]) -> list[dict
         return []
     placeholders = ",".join(["?"] * len(ids))
     cur = conn.execute(f"SELECT * FROM articles WHERE article_id IN ({placeholders})", ids)
-    return list(cur.fetchall())
+    return cur.fetchall()
 
 
 # Embeddings
+def encode_vector(vector: list[float]) -> bytes:
+    # Stored as little-endian FP16: a quarter of the JSON text size, and the
+    # precision loss is negligible for normalized embeddings.
+    return struct.pack(f"<{len(vector)}e", *vector)
+
+
+def decode_vector(raw: bytes | str | None) -> list[float] | None:
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        # Rows written before FP16 storage hold a JSON list
+        return [float(x) for x in json.loads(raw)]
+    return list(struct.unpack(f"<{len(raw) // 2}e", raw))
+
+
+def encode_centroid(vector: list[float]) -> bytes:
+    # Symmetric int8 quantization: a float32 scale followed by one signed byte
+    # per dimension. Centroids are only compared by direction, so 8 bits per
+    # dimension is plenty.
+    # max/min run in C; x * inv then never exceeds 127 in magnitude, so the
+    # rounded values need no clamping
+    scale = max(max(vector, default=0.0), -min(vector, default=0.0)) / 127 or 1.0
+    inv = 1 / scale
+    return struct.pack(f"<f{len(vector)}b", scale, *[round(x * inv) for x in vector])
+
+
+def decode_centroid(raw: bytes | str | None) -> list[float] | None:
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        # Rows written before quantization hold a JSON list
+        return [float(x) for x in json.loads(raw)]
+    scale, *q = struct.unpack(f"<f{len(raw) - 4}b", raw)
+    return [x * scale for x in q]
+
+
 def get_embedding(conn: sqlite3.Connection, content_hash: str) -> dict[str, Any] | None:
     cur = conn.execute("SELECT * FROM embeddings WHERE content_hash=?", (content_hash,))
     row = cur.fetchone()
     return row
 
 
+# Hashes bound per IN (...) query, well under SQLite's variable limit
+HASHES_PER_SELECT = 500
+
+
+def fetch_embedding_vectors(conn: sqlite3.Connection, content_hashes: list[str]) -> dict[str, list[float]]:
+    # One query per HASHES_PER_SELECT hashes; rows that fail to decode are left out
+    out: dict[str, list[float]] = {}
+    for i in range(0, len(content_hashes), HASHES_PER_SELECT):
+        chunk = content_hashes[i : i + HASHES_PER_SELECT]
+        placeholders = ",".join(["?"] * len(chunk))
+        cur = conn.execute(f"SELECT content_hash, vector FROM embeddings WHERE content_hash IN ({placeholders})", chunk)
+        for r in cur.fetchall():
+            try:
+                vec = decode_vector(r["vector"])
+            except (ValueError, struct.error):
+                continue
+            if vec:
+                out[r["content_hash"]] = vec
+    return out
+
+
 def put_embedding(conn: sqlite3.Connection, content_hash: str, model: str, dims: int, vector: list[float]) -> None:
-    with _lock:
-        conn.execute(
+    put_embeddings(conn, [(content_hash, model, dims, vector)])
+
+
+def put_embeddings(conn: sqlite3.Connection, rows: list[tuple[str, str, int, list[float]]]) -> None:
+    if not rows:
+        return
+    with _lock, transaction(conn):
+        conn.executemany(
             """
             INSERT INTO embeddings(content_hash, model, dims, vector)
             VALUES(?,?,?,?)
             ON CONFLICT(content_hash) DO UPDATE SET model=excluded.model, dims=excluded.dims, vector=excluded.vector
             """,
-            (content_hash, model, dims, json.dumps(vector)),
+            [(ch, model, dims, encode_vector(vec)) for ch, model, dims, vec in rows],
+        )
+
+
+# Signatures
+def load_signatures(conn: sqlite3.Connection, content_hashes: list[str] | None, version: int) -> dict[str, tuple[int, bytes, int]]:
+    # (simhash, minhash, shingle_count) per hash; content_hashes=None loads
+    # the signatures of every stored article
+    if content_hashes is None:
+        rows = conn.execute(
+            "SELECT s.content_hash, s.simhash, s.minhash, s.shingle_count FROM article_signatures s "
+            "JOIN articles a ON a.content_hash = s.content_hash WHERE s.version=?",
+            (version,),
+        ).fetchall()
+    else:
+        # One query per HASHES_PER_SELECT hashes
+        rows = []
+        for i in range(0, len(content_hashes), HASHES_PER_SELECT):
+            chunk = content_hashes[i : i + HASHES_PER_SELECT]
+            placeholders = ",".join(["?"] * len(chunk))
+            rows += conn.execute(
+                f"SELECT content_hash, simhash, minhash, shingle_count FROM article_signatures WHERE version=? AND content_hash IN ({placeholders})",
+                [version, *chunk],
+            ).fetchall()
+    # simhash is stored as signed 64-bit, SQLite's INTEGER range
+    return {r["content_hash"]: (r["simhash"] & 0xFFFFFFFFFFFFFFFF, r["minhash"], r["shingle_count"] or 0) for r in rows}
+
+
+def put_signatures(conn: sqlite3.Connection, rows: list[tuple[str, int, bytes, int]], version: int) -> None:
+    if not rows:
+        return
+    with _lock, transaction(conn):
+        conn.executemany(
+            "INSERT OR REPLACE INTO article_signatures(content_hash, version, simhash, minhash, shingle_count) VALUES(?,?,?,?,?)",
+            [(ch, version, sim - (1 << 64) if sim >= 1 << 63 else sim, sig, n) for ch, sim, sig, n in rows],
         )
 
 
 # Clusters
 def put_cluster(conn: sqlite3.Connection, cluster_id: str, method: str, centroid_embed: list[float] | None, representative_article_id: str) -> None:
-    with _lock:
-        conn.execute(
+    put_clusters(conn, [(cluster_id, method, centroid_embed, representative_article_id)])
+
+
+def put_clusters(conn: sqlite3.Connection, rows: list[tuple[str, str, list[float] | None, str]]) -> None:
+    if not rows:
+        return
+    created_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    with _lock, transaction(conn):
+        conn.executemany(
             """
             INSERT INTO clusters(cluster_id, method, centroid_embed, representative_article_id, created_at)
             VALUES(?,?,?,?,?)
             ON CONFLICT(cluster_id) DO UPDATE SET method=excluded.method, centroid_embed=excluded.centroid_embed, representative_article_id=excluded.representative_article_id
             """,
-            (cluster_id, method, json.dumps(centroid_embed) if centroid_embed else None, representative_article_id, datetime.utcnow().isoformat() + "Z"),
+            [(cid, method, encode_centroid(centroid) if centroid else None, rep_id, created_at) for cid, method, centroid, rep_id in rows],
         )
 
 
 def put_cluster_members(conn: sqlite3.Connection, cluster_id: str, article_ids: list[str]) -> None:
-    with _lock:
-        conn.executemany(
-            "INSERT OR IGNORE INTO cluster_members(cluster_id, article_id) VALUES(?,?)",
-            [(cluster_id, a) for a in article_ids],
-        )
+    put_memberships(conn, [(cluster_id, a) for a in article_ids])
+
+
+# Rows per multi-row INSERT: 1000 bound parameters at two columns, well
+# under SQLite's variable limit
+_MEMBER_ROWS_PER_INSERT = 500
+
+
+def put_memberships(conn: sqlite3.Connection, pairs: list[tuple[str, str]]) -> None:
+    # (cluster_id, article_id) pairs, possibly spanning many clusters. Written
+    # as multi-row VALUES statements, which bind and step far fewer times
+    # than one executemany row per pair.
+    if not pairs:
+        return
+    with _lock, transaction(conn):
+        for i in range(0, len(pairs), _MEMBER_ROWS_PER_INSERT):
+            chunk = pairs[i : i + _MEMBER_ROWS_PER_INSERT]
+            conn.execute(
+                f"INSERT OR IGNORE INTO cluster_members(cluster_id, article_id) VALUES {','.join(['(?,?)'] * len(chunk))}",
+                [x for pair in chunk for x in pair],
+            )
 
 
 def fetch_clusters(conn: sqlite3.Connection) -> list[dict[str, Any]]:
     cur = conn.execute("SELECT * FROM clusters")
-    return list(cur.fetchall())
+    return cur.fetchall()
 
 
 def fetch_cluster_members(conn: sqlite3.Connection, cluster_id: str) -> list[str]:
     cur = conn.execute("SELECT article_id FROM cluster_members WHERE cluster_id=?", (cluster_id,))
     return [r["article_id"] for r in cur.fetchall()]
 
+
+def fetch_cluster_articles(conn: sqlite3.Connection, cluster_id: str) -> list[dict[str, Any]]:
+    # Member ids and their article rows in one query instead of two
+    cur = conn.execute(
+        "SELECT a.* FROM cluster_members m JOIN articles a ON a.article_id = m.article_id WHERE m.cluster_id=?",
+        (cluster_id,),
+    )
+    return cur.fetchall()
+
+
+# Artifacts
+def write_json(path: Path, data: Any) -> None:
+    # orjson is an optional speedup; output is the same indented JSON either way
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        payload = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    # Written beside the target and renamed over it, so a crash mid-write
+    # never leaves a truncated file behind
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(payload)
+    os.replace(tmp, path)
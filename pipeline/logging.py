@@ -7,7 +7,14 @@ import pathlib
 def setup_logging(run_dir: pathlib.Path, level: str = "INFO") -> logging.Logger:
     logger = logging.getLogger("pipeline")
     logger.setLevel(getattr(logging, level.upper(), logging.INFO))
-    logger.handlers.clear()
+    log_path = run_dir / "logs" / "run.log"
+    # Idempotent for the same run directory; otherwise close the previous
+    # run's handlers rather than leaking their open log files.
+    if any(getattr(h, "baseFilename", None) == str(log_path.resolve()) for h in logger.handlers):
+        return logger
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+        h.close()
 
     fmt = logging.Formatter(
         fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
@@ -20,7 +27,6 @@ def setup_logging(run_dir: pathlib.Path, level: str = "INFO") -> logging.Logger:
     logger.addHandler(sh)
 
     # File
-    log_path = run_dir / "logs" / "run.log"
     fh = logging.FileHandler(log_path, encoding="utf-8")
     fh.setFormatter(fmt)
     logger.addHandler(fh)
@@ -18,6 +18,10 @@ TRACKING_PARAMS = {
     "gclid",
 }
 
+PREPRINT_TAGS = ("arxiv", "biorxiv", "medrxiv")
+
+_WS_RE = re.compile(r"\s+")
+
 
 def canonicalize_url(url: str) -> str:
     # Normalize and strip tracking params and fragments
@@ -44,7 +48,7 @@ def canonicalize_url(url: str) -> str:
 
 def clean_text(text: str) -> str:
     # Collapse whitespace and strip
-    text = re.sub(r"\s+", " ", text or "").strip()
+    text = _WS_RE.sub(" ", text or "").strip()
     return text
 
 
@@ -72,4 +76,4 @@ def content_hash(text: str) -> str:
 def is_preprint_source(source_id: str, url: str | None) -> bool:
     s = (source_id or "").lower()
     u = (url or "").lower()
-    return any(x in s or x in u for x in ("arxiv", "biorxiv", "medrxiv"))
+    return any(x in s or x in u for x in PREPRINT_TAGS)
@@ -0,0 +1,13 @@
+import pytest
+
+from pipeline import io
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    # Point the pipeline at a fresh SQLite file instead of state/pipeline.sqlite
+    db_path = tmp_path / "test.sqlite"
+    monkeypatch.setattr(io, "DB_PATH", db_path)
+    monkeypatch.setattr(io, "ensure_dirs", lambda: db_path.parent.mkdir(parents=True, exist_ok=True))
+    io.init_db()
+    return db_path
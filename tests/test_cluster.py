@@ -1,7 +1,8 @@
 import os
 
-from pipeline.io import Article, db, init_db, upsert_article
-from pipeline.cluster import cluster as do_cluster
+from pipeline import cluster as cluster_mod
+from pipeline.io import Article, db, init_db, load_signatures, upsert_article
+from pipeline.cluster import SIGNATURE_VERSION, cluster as do_cluster
 
 
 def test_same_canonical_url_cluster_together(tmp_path):
@@ -61,3 +62,71 @@ def test_same_canonical_url_cluster_together(tmp_path):
     sizes = sorted(len(c["members"]) for c in clusters)
     assert sizes == [1, 2]
 
+
+# Three near-duplicate versions of one story at different URLs: each version
+# edits a few words of the previous one, so the first and last are too far
+# apart to match directly and are only grouped through the middle one.
+_BASE = (
+    "Researchers at the institute trained a small neural network on brain recordings from mice and found that "
+    "the model predicts which neurons fire during a memory task far better than earlier methods. The team says "
+    "the approach needs less data, runs on a single graphics card, and could help map circuits in the hippocampus "
+    "that support spatial navigation and learning over several days of repeated trials in the maze."
+)
+_UNRELATED = (
+    "Astronomers report a faint companion orbiting a nearby red dwarf star, detected through tiny wobbles in "
+    "its light over a decade of observations with ground telescopes."
+)
+
+
+def _edit(text, edits):
+    words = text.split()
+    for i, w in edits.items():
+        words[i] = w
+    return " ".join(words)
+
+
+def _insert_story_versions():
+    v2 = _edit(_BASE, {5: "large", 30: "cheaper"})
+    v3 = _edit(v2, {40: "laptop", 50: "cortex", 60: "weeks"})
+    texts = {"a1": _BASE, "a2": v2, "a3": v3, "a4": _UNRELATED}
+    with db() as conn:
+        for aid, text in texts.items():
+            upsert_article(
+                conn,
+                Article(
+                    article_id=aid,
+                    canonical_url=f"https://example.com/{aid}",
+                    title=aid,
+                    byline=None,
+                    published_at="2025-09-01T00:00:00Z",
+                    source_id="src",
+                    is_preprint=0,
+                    text=text,
+                    lang="en",
+                    tags=None,
+                    extraction_quality=0.9,
+                    content_hash=f"h{aid}",
+                ),
+            )
+
+
+def test_minhash_groups_near_duplicates_transitively(tmp_db, monkeypatch):
+    monkeypatch.setenv("EMBED_OFFLINE", "1")
+    _insert_story_versions()
+    # threshold=0 only joins identical simhashes, leaving matches to MinHash/LSH
+    first = do_cluster(threshold=0)
+    assert [c["members"] for c in first] == [["a1", "a2", "a3"], ["a4"]]
+    # The second run reads cached signatures and re-reads candidate texts
+    with db() as conn:
+        assert len(load_signatures(conn, None, SIGNATURE_VERSION)) == 4
+    second = do_cluster(threshold=0)
+    assert [c["members"] for c in second] == [["a1", "a2", "a3"], ["a4"]]
+
+
+def test_simhash_groups_near_duplicates_transitively(tmp_db, monkeypatch):
+    monkeypatch.setenv("EMBED_OFFLINE", "1")
+    # Unreachable Jaccard threshold, so only simhash distance can join articles
+    monkeypatch.setattr(cluster_mod, "JACCARD_MIN", 1.1)
+    _insert_story_versions()
+    clusters = do_cluster(threshold=12)
+    assert [c["members"] for c in clusters] == [["a1", "a2", "a3"], ["a4"]]
@@ -32,3 +32,37 @@ def test_embed_runtime_toggle(monkeypatch):
     assert vec_online == [0.0] * embed.EMBED_DIMS
     assert vec_online != vec_offline
 
+
+def test_stub_vectors_recomputed_when_model_changes(tmp_db, monkeypatch):
+    from pipeline import io
+    from pipeline.io import Article, db, upsert_article
+
+    with db() as conn:
+        upsert_article(
+            conn,
+            Article(
+                article_id="a1",
+                canonical_url="http://example.com/1",
+                title="t1",
+                byline=None,
+                published_at=None,
+                source_id="src",
+                is_preprint=0,
+                text="hello world",
+                lang=None,
+                tags=None,
+                extraction_quality=None,
+                content_hash="hash",
+            ),
+        )
+
+    monkeypatch.setenv("EMBED_OFFLINE", "1")
+    assert embed.ensure_embeddings_for_hashes(["hash"]) == 1
+    assert embed.ensure_embeddings_for_hashes(["hash"]) == 0
+
+    monkeypatch.setattr(embed, "_embed_openai_chunks", lambda chunks, model=embed.EMBED_MODEL: [[1.0] * embed.EMBED_DIMS for _ in chunks])
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    monkeypatch.setenv("EMBED_OFFLINE", "0")
+    assert embed.ensure_embeddings_for_hashes(["hash"]) == 1
+    with db() as conn:
+        assert io.get_embedding(conn, "hash")["model"] == embed.EMBED_MODEL
@@ -3,20 +3,22 @@ from pathlib import Path
 
 def test_run_all_outputs_single_dir(tmp_path, monkeypatch):
     from pipeline import __main__ as main
+    from pipeline import cluster, extract, ingest, rank, summarize
 
-    # Avoid network and heavy work by mocking pipeline steps
-    monkeypatch.setattr(main, "fetch_feeds", lambda since, max_items, logger: {})
+    # Avoid network and heavy work by mocking pipeline steps; the CLI imports
+    # them lazily, so patch the stage modules themselves.
+    monkeypatch.setattr(ingest, "fetch_feeds", lambda since, max_items, parallel, logger: {})
     monkeypatch.setattr(
-        main, "extract_step", lambda limit, parallel, logger: 0
+        extract, "extract", lambda limit, parallel, logger: 0
     )
-    monkeypatch.setattr(main, "cluster_step", lambda logger: [])
+    monkeypatch.setattr(cluster, "cluster", lambda parallel, logger: [])
 
     dummy_summary = [
         {"cluster_id": 1, "bullets": ["b1"], "citations": []}
     ]
-    monkeypatch.setattr(main, "summarize", lambda logger: dummy_summary)
+    monkeypatch.setattr(summarize, "summarize", lambda logger: dummy_summary)
     monkeypatch.setattr(
-        main,
+        rank,
         "score_clusters",
         lambda: [{"cluster_id": 1, "score": 1.0, "size": 1}],
     )
@@ -0,0 +1,9 @@
+from pipeline.io import db, load_signatures, put_signatures
+
+
+def test_signature_cache_roundtrip(tmp_db):
+    sig = bytes(range(24))
+    with db() as conn:
+        put_signatures(conn, [("h1", 2**64 - 1, sig, 42)], version=1)
+        assert load_signatures(conn, ["h1", "h2"], version=1) == {"h1": (2**64 - 1, sig, 42)}
+        assert load_signatures(conn, ["h1"], version=2) == {}
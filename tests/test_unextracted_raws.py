@@ -0,0 +1,24 @@
+from pipeline.io import ArticleRaw, db, fetch_unextracted_raws, insert_raw_articles, mark_raw_extracted
+
+
+def test_marked_raws_are_not_extracted_again(tmp_db):
+    raws = [
+        ArticleRaw(
+            source_id="src",
+            feed_url="https://example.com/feed",
+            entry_id=f"e{i}",
+            link=f"https://example.com/{i}",
+            title=f"t{i}",
+            summary=None,
+            published_at="Mon, 01 Sep 2025 10:00:00 GMT",
+            fetched_at="2025-09-01T10:00:00Z",
+            etag=None,
+            last_modified=None,
+        )
+        for i in range(2)
+    ]
+    with db() as conn:
+        assert insert_raw_articles(conn, raws) == 2
+        mark_raw_extracted(conn, "e0", "https://example.com/feed", "a0")
+        pending = fetch_unextracted_raws(conn)
+    assert [r["entry_id"] for r in pending] == ["e1"]
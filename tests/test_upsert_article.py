@@ -1,8 +1,14 @@
+import pytest
+
 from pipeline import io
 from pipeline.io import Article, init_db, db, upsert_article, fetch_articles
 
 
-def test_upsert_article_duplicate_content_hash(tmp_path, monkeypatch):
+# Both the single-statement upsert and the SELECT-first path used on SQLite
+# releases older than 3.35
+@pytest.mark.parametrize("multi_upsert", [True, False])
+def test_upsert_article_duplicate_content_hash(tmp_path, monkeypatch, multi_upsert):
+    monkeypatch.setattr(io, "_MULTI_UPSERT", multi_upsert)
     db_path = tmp_path / "test.sqlite"
     monkeypatch.setattr(io, "DB_PATH", db_path)
     monkeypatch.setattr(io, "ensure_dirs", lambda: db_path.parent.mkdir(parents=True, exist_ok=True))
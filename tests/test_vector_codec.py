@@ -0,0 +1,25 @@
+import json
+
+from pipeline.io import decode_centroid, decode_vector, encode_centroid, encode_vector
+
+
+def test_fp16_roundtrip_is_close():
+    vec = [0.5, -0.25, 0.1234, 0.0]
+    raw = encode_vector(vec)
+    assert len(raw) == 2 * len(vec)
+    out = decode_vector(raw)
+    assert all(abs(a - b) < 1e-3 for a, b in zip(vec, out))
+
+
+def test_decode_legacy_json_rows():
+    assert decode_vector(json.dumps([0.5, 0.25])) == [0.5, 0.25]
+    assert decode_vector(None) is None
+
+
+def test_int8_centroid_roundtrip_is_close():
+    vec = [0.5, -0.25, 0.1234, 0.0]
+    raw = encode_centroid(vec)
+    assert len(raw) == 4 + len(vec)
+    out = decode_centroid(raw)
+    assert all(abs(a - b) < 0.5 / 127 for a, b in zip(vec, out))
+    assert decode_centroid(json.dumps([0.5])) == [0.5]